@@ -0,0 +1,109 @@
+"""
+Benchmark the import time of the evaluation core and the spawn time of pool workers.
+
+Workers import evaluation.util, the module of the task used by compute-metrics-all-teams.py. It reads the submissions
+with pandas, so the spawn budget includes the pandas import while the cold start budget covers the core only.
+
+Exits with a non-zero status if the cold start or worker spawn time exceeds its budget, or if one of the heavy
+dependencies is imported by the evaluation core.
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import subprocess
+import multiprocessing
+
+import numpy as np
+
+# Modules that make up the evaluation core
+CORE_MODULES = ['evaluation.metrics', 'evaluation.sampling', 'evaluation.config']
+
+# Modules imported by the pool workers of compute-metrics-all-teams.py
+WORKER_MODULES = ['evaluation.util']
+
+# Dependencies that should only be imported when exporting or plotting
+HEAVY_MODULES = ['pandas', 'sklearn', 'matplotlib']
+
+
+def _worker_ready(_):
+    """Task for the pool workers, imports the same modules as the real worker task"""
+    for module in WORKER_MODULES:
+        __import__(module)
+    return True
+
+
+def measure_cold_start():
+    """Import the evaluation core in a fresh interpreter.
+
+    Returns:
+        Wall time of the interpreter in seconds, list of heavy modules that were imported.
+    """
+    code = (f"import sys\n"
+            f"import {', '.join(CORE_MODULES)}\n"
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+
+    start = time.perf_counter()
+    # Run from the directory of this script so the evaluation package is found regardless of the working directory
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    duration = time.perf_counter() - start
+
+    return duration, [m for m in output.strip().split(',') if m]
+
+
+def measure_worker_spawn(pool_size):
+    """Start a pool of fresh worker processes that each import the modules of the real worker task.
+
+    Args:
+        pool_size: Number of workers to spawn.
+
+    Returns:
+        Time in seconds until all workers have imported their modules.
+    """
+    start = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(pool_size) as pool:
+        pool.map(_worker_ready, range(pool_size), chunksize=1)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+
+    # Initialize logger and show output
+    logging.getLogger().setLevel(logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Benchmark import and worker spawn time of the evaluation core.')
+    parser.add_argument('--repeats', help='Number of repetitions, the median is compared to the budget.', type=int, default=5)
+    parser.add_argument('--pool_size', help='Number of workers to spawn.', type=int, default=4)
+    parser.add_argument('--import_budget', help='Budget in seconds for a cold start.', type=float, default=0.5)
+    parser.add_argument('--spawn_budget', help='Budget in seconds to spawn the worker pool.', type=float, default=3.0)
+    args = parser.parse_args()
+
+    cold_starts = []
+    heavy_imports = set()
+    for _ in range(args.repeats):
+        duration, imported = measure_cold_start()
+        cold_starts.append(duration)
+        heavy_imports.update(imported)
+
+    spawn_times = [measure_worker_spawn(args.pool_size) for _ in range(args.repeats)]
+
+    cold_start = np.median(cold_starts)
+    spawn_time = np.median(spawn_times)
+    logging.info(f"Cold start: {cold_start:.3f}s (budget {args.import_budget:.3f}s)")
+    logging.info(f"Spawning {args.pool_size} workers: {spawn_time:.3f}s (budget {args.spawn_budget:.3f}s)")
+
+    failed = False
+    if heavy_imports:
+        logging.error(f"The evaluation core imports heavy dependencies: {', '.join(sorted(heavy_imports))}.")
+        failed = True
+    if cold_start > args.import_budget:
+        logging.error("Cold start exceeds the budget.")
+        failed = True
+    if spawn_time > args.spawn_budget:
+        logging.error("Worker spawn exceeds the budget.")
+        failed = True
+
+    sys.exit(1 if failed else 0)
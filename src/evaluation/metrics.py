@@ -6,9 +6,56 @@ Each function has as input:
 - A submission DataFrame with the team's predictions.
 
 Each functions outputs a dictionary with one or more metrics.
+
+Only NumPy is used to compute the metrics, so importing this module is cheap for pool workers and scripts.
 """
 
-from sklearn import metrics as skmetrics
+import numpy as np
+
+def _confusion_matrix(y_true, y_pred, labels):
+    """Confusion matrix with the true labels as rows and the predictions as columns.
+
+    Values that are not in labels are ignored, as in sklearn.metrics.confusion_matrix.
+    """
+    labels = np.asarray(labels)
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+
+    # Map values to their index in labels
+    true_match = y_true[:, None] == labels[None, :]
+    pred_match = y_pred[:, None] == labels[None, :]
+    valid = true_match.any(axis=1) & pred_match.any(axis=1)
+
+    n_labels = len(labels)
+    indices = true_match[valid].argmax(axis=1) * n_labels + pred_match[valid].argmax(axis=1)
+
+    return np.bincount(indices, minlength=n_labels * n_labels).reshape(n_labels, n_labels)
+
+def _cohen_kappa_score(y1, y2, labels, weights=None):
+    """Cohen's kappa, optionally weighted ('linear' or 'quadratic'), as in sklearn.metrics.cohen_kappa_score"""
+
+    cm = _confusion_matrix(y_true=y1, y_pred=y2, labels=labels)
+    n_labels = len(labels)
+
+    # Expected agreement by chance
+    expected = np.outer(cm.sum(axis=1), cm.sum(axis=0)) / cm.sum()
+
+    if weights is None:
+        w = np.ones((n_labels, n_labels), dtype=int)
+        np.fill_diagonal(w, 0)
+    elif weights == 'linear':
+        w = np.abs(np.subtract.outer(np.arange(n_labels), np.arange(n_labels)))
+    elif weights == 'quadratic':
+        w = np.subtract.outer(np.arange(n_labels), np.arange(n_labels)) ** 2
+    else:
+        raise Exception("Unknown kappa weighting type, should be one of [None, linear, quadratic].")
+
+    return 1 - np.sum(w * cm) / np.sum(w * expected)
+
+def _accuracy_score(y_true, y_pred):
+    """Fraction of correct predictions"""
+
+    return np.mean(np.asarray(y_true) == np.asarray(y_pred))
 
 def count(reference, submission):
     """Simply return the length of the dataset"""
@@ -20,7 +67,7 @@ def count(reference, submission):
 
 def qwk(reference, submission):
     """Quadratically weighted Cohen's kappa"""
-    return {'qwk': skmetrics.cohen_kappa_score(
+    return {'qwk': _cohen_kappa_score(
         y1=reference.isup_grade,
         y2=submission.isup_grade,
         labels=[0,1,2,3,4,5],
@@ -30,7 +77,7 @@ def qwk(reference, submission):
 def lwk(reference, submission):
     """Linear weighted Cohen's kappa"""
 
-    return {'lwk': skmetrics.cohen_kappa_score(
+    return {'lwk': _cohen_kappa_score(
         y1=reference.isup_grade,
         y2=submission.isup_grade,
         labels=[0,1,2,3,4,5],
@@ -40,7 +87,7 @@ def lwk(reference, submission):
 def acc(reference, submission):
     """Accuracy"""
 
-    return {'acc': skmetrics.accuracy_score(
+    return {'acc': _accuracy_score(
         y_true=reference.isup_grade,
         y_pred=submission.isup_grade,
     )}
@@ -51,7 +98,7 @@ def acc_tumor_only(reference, submission):
     reference_tumor = reference[reference.isup_grade > 0]
     submission_tumor = submission[reference.isup_grade > 0]
 
-    return {'acc_gg_tumor': skmetrics.accuracy_score(
+    return {'acc_gg_tumor': _accuracy_score(
         y_true=reference_tumor.isup_grade,
         y_pred=submission_tumor.isup_grade,
     )}
@@ -60,10 +107,9 @@ def acc_tumor_only(reference, submission):
 def screening_tumor(reference, submission):
     """Compute screening metrics (e.g. sensitivity) for tumor vs benign"""
 
-    cm = skmetrics.confusion_matrix(y_true=reference.isup_grade > 0,
-                                    y_pred=submission.isup_grade > 0,
-                                    normalize=None,
-                                    labels=[0,1],
+    cm = _confusion_matrix(y_true=reference.isup_grade > 0,
+                           y_pred=submission.isup_grade > 0,
+                           labels=[0,1],
     )
     tn, fp, fn, tp = cm.ravel()
 
@@ -82,10 +128,9 @@ def screening_tumor(reference, submission):
 def screening_gg2(reference, submission):
     """Compute screening metrics (e.g. sensitivity) for >= gg2"""
 
-    cm = skmetrics.confusion_matrix(y_true=reference.isup_grade > 1,
-                                    y_pred=submission.isup_grade > 1,
-                                    normalize=None,
-                                    labels=[0,1],
+    cm = _confusion_matrix(y_true=reference.isup_grade > 1,
+                           y_pred=submission.isup_grade > 1,
+                           labels=[0,1],
     )
     tn, fp, fn, tp = cm.ravel()
 
@@ -104,10 +149,9 @@ def screening_gg2(reference, submission):
 def screening_gg3(reference, submission):
     """Compute screening metrics (e.g. sensitivity) for >= gg3"""
 
-    cm = skmetrics.confusion_matrix(y_true=reference.isup_grade > 2,
-                                    y_pred=submission.isup_grade > 2,
-                                    normalize=None,
-                                    labels=[0,1],
+    cm = _confusion_matrix(y_true=reference.isup_grade > 2,
+                           y_pred=submission.isup_grade > 2,
+                           labels=[0,1],
     )
     tn, fp, fn, tp = cm.ravel()
 
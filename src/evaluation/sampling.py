@@ -1,13 +1,9 @@
 """
 Sampling functions
 """
-import matplotlib.cbook
 import numpy as np
-import pandas as pd
 
-import multiprocessing
 import tqdm
-import functools
 
 def compute_metric_for_runs(metric_func, reference, submissions):
     """Compute a metric across runs.
@@ -31,6 +27,45 @@ def compute_metric_for_runs(metric_func, reference, submissions):
     return {k: np.mean([r[k] for r in run_results]) for k in run_results[0].keys()}
 
 
+def boxplot_stats(values, whis=1.5):
+    """Compute the statistics needed to draw a boxplot.
+
+    Mirrors matplotlib.cbook.boxplot_stats for a single dataset (same keys and order) without importing matplotlib.
+
+    Args:
+        values: List of values.
+        whis: Position of the whiskers as a multiple of the IQR beyond the quartiles.
+
+    Returns:
+        Dictionary with the mean, iqr, notch (cilo, cihi), whiskers, fliers and quartiles.
+    """
+    x = np.asarray(values, dtype=float).ravel()
+
+    if len(x) == 0:
+        return {'mean': np.nan, 'iqr': np.nan, 'cilo': np.nan, 'cihi': np.nan, 'whishi': np.nan,
+                'whislo': np.nan, 'fliers': np.array([]), 'q1': np.nan, 'med': np.nan, 'q3': np.nan}
+
+    stats = {'mean': np.mean(x)}
+
+    q1, med, q3 = np.percentile(x, [25, 50, 75])
+    stats['iqr'] = q3 - q1
+
+    # Confidence interval around the median (notch)
+    stats['cilo'] = med - 1.57 * stats['iqr'] / np.sqrt(len(x))
+    stats['cihi'] = med + 1.57 * stats['iqr'] / np.sqrt(len(x))
+
+    # Whiskers end at the most extreme values within whis * IQR of the quartiles
+    wiskhi = x[x <= q3 + whis * stats['iqr']]
+    stats['whishi'] = q3 if len(wiskhi) == 0 or np.max(wiskhi) < q3 else np.max(wiskhi)
+    wisklo = x[x >= q1 - whis * stats['iqr']]
+    stats['whislo'] = q1 if len(wisklo) == 0 or np.min(wisklo) > q1 else np.min(wisklo)
+
+    stats['fliers'] = np.concatenate([x[x < stats['whislo']], x[x > stats['whishi']]])
+    stats['q1'], stats['med'], stats['q3'] = q1, med, q3
+
+    return stats
+
+
 def _summarize_bootstrapped_metric(bootstrap_results):
     """Compute summary statistics.
 
@@ -48,7 +83,7 @@ def _summarize_bootstrapped_metric(bootstrap_results):
         results[f'{metric_name}_cihigh'] = np.percentile(values, 97.5)
 
         # Compute all metrics we need to later show a boxplot
-        for k, v in matplotlib.cbook.boxplot_stats(values)[0].items():
+        for k, v in boxplot_stats(values).items():
             # Convert fliers to string so we can safely export it
             results[f'{metric_name}_bxp_{k}'] = v if k != 'fliers' else ';'.join([str(x) for x in v])
 
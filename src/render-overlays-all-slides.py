@@ -0,0 +1,63 @@
+"""
+Render thumbnails and mask overlays for all slides in a dataset split and write a browsable HTML gallery.
+"""
+
+import os
+import logging
+import argparse
+import multiprocessing
+import tqdm
+import functools
+
+import pandas as pd
+
+import slides.overlay
+
+if __name__ == '__main__':
+
+    # Initialize logger and show output
+    logging.getLogger().setLevel(logging.INFO)
+    logging.info("Rendering thumbnails and overlays for all slides.")
+
+    parser = argparse.ArgumentParser(description='Render slide thumbnails and mask overlays.')
+    parser.add_argument('--labels', help='Path to the csv with image_id and data_provider columns (e.g. train.csv).', required=True)
+    parser.add_argument('--data_dir', help='Directory containing the slides.', required=True)
+    parser.add_argument('--mask_dir', help='Directory containing the label masks.', required=True)
+    parser.add_argument('--output', help='Path to write the gallery to.', default='../gallery')
+    parser.add_argument('--usage', help='Only render cases with this value in the Usage column.', default=None)
+    parser.add_argument('--max_size', help='Maximum width and height of the rendered images.', type=int, default=800)
+    parser.add_argument('--alpha', help='Opacity of the mask in the overlay.', type=float, default=0.8)
+    parser.add_argument('--pool_size', help='Size of the pool for multiprocessing', type=int, default=16)
+    args = parser.parse_args()
+
+    # Select the cases of this split
+    labels_df = pd.read_csv(args.labels, header=0)
+    if args.usage:
+        labels_df = labels_df[labels_df.Usage == args.usage]
+    columns = [c for c in ['image_id', 'data_provider', 'isup_grade', 'gleason_score'] if c in labels_df.columns]
+    rows = labels_df[columns].to_dict('records')
+
+    logging.info(f"Found {len(rows)} slides to process.")
+
+    # Image directories depend on the render settings and are created by the workers
+    os.makedirs(args.output, exist_ok=True)
+
+    # Render the slides in parallel, slides with up to date outputs are skipped
+    entries = []
+    pool = multiprocessing.Pool(args.pool_size)
+    task = functools.partial(slides.overlay.render_slide_task, args.data_dir, args.mask_dir, args.output,
+                             (args.max_size, args.max_size), args.alpha)
+    for entry in tqdm.tqdm(pool.imap_unordered(func=task, iterable=rows), total=len(rows)):
+        entries.append(entry)
+    pool.close()
+    pool.join()
+
+    failed = [e['image_id'] for e in entries if e['error']]
+    logging.info(f"Rendered {sum(e['rendered'] for e in entries)} slides, "
+                 f"{sum(not e['rendered'] and not e['error'] for e in entries)} were up to date, {len(failed)} failed.")
+    if failed:
+        logging.warning(f"Failed to render the following slides: {', '.join(sorted(failed))}.")
+
+    slides.overlay.write_gallery(entries, os.path.join(args.output, 'index.html'))
+
+    logging.info(f"Gallery written to {os.path.join(args.output, 'index.html')}")
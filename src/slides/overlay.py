@@ -0,0 +1,253 @@
+"""
+Render thumbnails and mask overlays of slides.
+
+Only the pyramid level closest to the requested output size is decoded, instead of the full resolution image.
+"""
+import os
+import html
+import logging
+
+import numpy as np
+
+# Color maps of the label masks, as flat RGB palettes for PIL
+PALETTES = {
+    # Mapping: {0: background, 1: stroma, 2: benign epithelium, 3: Gleason 3, 4: Gleason 4, 5: Gleason 5}
+    'radboud': (np.array([0, 0, 0, 0.5, 0.5, 0.5, 0, 1, 0, 1, 1, 0.7, 1, 0.5, 0, 1, 0, 0]) * 255).astype(int),
+    # Mapping: {0: background, 1: benign, 2: cancer}
+    'karolinska': (np.array([0, 0, 0, 0, 1, 0, 1, 0, 0]) * 255).astype(int),
+}
+
+# Labels below this value are not overlayed on the slide (e.g. background and stroma)
+OVERLAY_THRESHOLDS = {
+    'radboud': 2,
+    'karolinska': 1,
+}
+
+
+def read_level_for_size(slide, max_size):
+    """Read the smallest pyramid level that is at least as large as the thumbnail fitting in the requested size.
+
+    Args:
+        slide: Opened openslide slide.
+        max_size: Tuple with the maximum (width, height) of the output.
+
+    Returns:
+        Index of the level that was read, PIL image of that level.
+    """
+    width, height = slide.dimensions
+    # The thumbnail is fit on its longest side relative to the box, so the largest ratio determines the downsampling
+    downsample = max(width / max_size[0], height / max_size[1])
+    level = slide.get_best_level_for_downsample(max(downsample, 1))
+
+    return level, slide.read_region((0, 0), level, slide.level_dimensions[level])
+
+
+def render_thumbnail(slide, max_size=(800, 800)):
+    """Render a thumbnail of a slide.
+
+    Args:
+        slide: Opened openslide slide.
+        max_size: Tuple with the maximum (width, height) of the thumbnail.
+
+    Returns:
+        RGB PIL image.
+    """
+    _, slide_data = read_level_for_size(slide, max_size)
+
+    thumbnail = slide_data.convert(mode='RGB')
+    thumbnail.thumbnail(size=max_size)
+
+    return thumbnail
+
+
+def render_overlay(slide, mask, center='radboud', alpha=0.8, max_size=(800, 800)):
+    """Render a mask overlayed on a slide.
+
+    Args:
+        slide: Opened openslide slide.
+        mask: Opened openslide mask of the slide.
+        center: Data provider, determines the color map (one of radboud, karolinska).
+        alpha: Opacity of the mask.
+        max_size: Tuple with the maximum (width, height) of the overlay.
+
+    Returns:
+        RGB PIL image.
+    """
+    import PIL.Image
+
+    if center not in PALETTES:
+        raise Exception("Unsupported palette, should be one of [radboud, karolinska].")
+
+    level, slide_data = read_level_for_size(slide, max_size)
+    slide_data = slide_data.convert(mode='RGB')
+
+    # Read the mask level with the same downsampling as the slide
+    mask_level = mask.get_best_level_for_downsample(slide.level_downsamples[level])
+    mask_data = mask.read_region((0, 0), mask_level, mask.level_dimensions[mask_level])
+
+    # Mask data is present in the R channel
+    mask_data = mask_data.split()[0]
+    if mask_data.size != slide_data.size:
+        mask_data = mask_data.resize(slide_data.size, resample=PIL.Image.NEAREST)
+
+    # Create alpha mask
+    alpha_int = int(round(255 * alpha))
+    alpha_content = np.less(mask_data, OVERLAY_THRESHOLDS[center]).astype('uint8') * alpha_int + (255 - alpha_int)
+    alpha_content = PIL.Image.fromarray(alpha_content)
+
+    preview_palette = np.zeros(shape=768, dtype=int)
+    preview_palette[0:len(PALETTES[center])] = PALETTES[center]
+    mask_data.putpalette(data=preview_palette.tolist())
+    mask_rgb = mask_data.convert(mode='RGB')
+
+    overlayed_image = PIL.Image.composite(image1=slide_data, image2=mask_rgb, mask=alpha_content)
+    overlayed_image.thumbnail(size=max_size, resample=PIL.Image.NEAREST)
+
+    return overlayed_image
+
+
+def is_up_to_date(output_path, input_paths):
+    """Check whether an output file exists and is newer than all its inputs.
+
+    Args:
+        output_path: Path to the rendered file.
+        input_paths: Paths to the files the output was rendered from.
+
+    Returns:
+        True if the output does not have to be rendered again.
+    """
+    if not os.path.isfile(output_path):
+        return False
+
+    output_mtime = os.path.getmtime(output_path)
+    return all(os.path.getmtime(p) <= output_mtime for p in input_paths)
+
+
+def save_image(image, path):
+    """Save an image by writing to a temporary file first, so interrupted runs never leave a partial file behind.
+
+    Args:
+        image: PIL image.
+        path: Path to write the image to, the extension determines the format.
+    """
+    base, extension = os.path.splitext(path)
+    temporary_path = f'{base}.tmp{extension}'
+
+    try:
+        image.save(temporary_path)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.isfile(temporary_path):
+            os.remove(temporary_path)
+
+
+def render_slide_task(data_dir, mask_dir, output_dir, max_size, alpha, row):
+    """Helper function to parallelize rendering of slides.
+
+    Args:
+        data_dir: Directory containing the <image_id>.tiff slides.
+        mask_dir: Directory containing the <image_id>_mask.tiff masks.
+        output_dir: Directory to write the thumbnails and overlays to.
+        max_size: Tuple with the maximum (width, height) of the rendered images.
+        alpha: Opacity of the mask in the overlay.
+        row: Dictionary with the image_id and data_provider of the slide, plus optional labels.
+
+    Returns:
+        Dictionary with the gallery entry of this slide. Slides that cannot be read are logged and marked with an
+        error instead of stopping the whole batch.
+    """
+    import openslide
+
+    image_id = row['image_id']
+    slide_path = os.path.join(data_dir, f'{image_id}.tiff')
+    mask_path = os.path.join(mask_dir, f'{image_id}_mask.tiff')
+
+    # The render settings are part of the output path, so changing them never reuses outdated images
+    size_dir = f'{max_size[0]}x{max_size[1]}'
+    thumbnail_path = os.path.join(output_dir, 'thumbnails', size_dir, f'{image_id}.png')
+    overlay_path = os.path.join(output_dir, 'overlays', f'{size_dir}_alpha{alpha}', f'{image_id}.png')
+
+    # Not all slides have a mask
+    has_mask = os.path.isfile(mask_path)
+
+    rendered = False
+    error = None
+    try:
+        # Inside the try, so a missing slide is reported as failed instead of stopping the whole batch
+        render_thumbnail_file = not is_up_to_date(thumbnail_path, [slide_path])
+        render_overlay_file = has_mask and not is_up_to_date(overlay_path, [slide_path, mask_path])
+
+        if render_thumbnail_file or render_overlay_file:
+            slide = openslide.OpenSlide(slide_path)
+            try:
+                if render_thumbnail_file:
+                    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+                    save_image(render_thumbnail(slide, max_size=max_size), thumbnail_path)
+                if render_overlay_file:
+                    mask = openslide.OpenSlide(mask_path)
+                    try:
+                        os.makedirs(os.path.dirname(overlay_path), exist_ok=True)
+                        save_image(render_overlay(slide, mask, center=row['data_provider'], alpha=alpha,
+                                                  max_size=max_size), overlay_path)
+                    finally:
+                        mask.close()
+            finally:
+                slide.close()
+            rendered = True
+    except Exception as e:
+        # Corrupt or unreadable slides (openslide and PIL errors) should not stop the other slides
+        logging.exception(f"Failed to render {image_id}.")
+        error = f'{type(e).__name__}: {e}'
+
+    return {
+        **row,
+        'thumbnail': os.path.relpath(thumbnail_path, output_dir),
+        'overlay': os.path.relpath(overlay_path, output_dir) if has_mask else None,
+        'rendered': rendered,
+        'error': error,
+    }
+
+
+def write_gallery(entries, path, title='PANDA slides'):
+    """Write a static HTML gallery of rendered slides.
+
+    Args:
+        entries: List of gallery entries as returned by render_slide_task.
+        path: Path of the HTML file, image paths in the entries are relative to its directory.
+        title: Title of the page.
+    """
+    figures = []
+    for entry in sorted(entries, key=lambda e: e['image_id']):
+        # Images of failed slides are missing or outdated, so only the error is shown
+        images = [] if entry['error'] else [entry['thumbnail']] + ([entry['overlay']] if entry['overlay'] else [])
+        images = ''.join(f'<a href="{html.escape(p)}"><img src="{html.escape(p)}" loading="lazy"></a>' for p in images)
+
+        # Show all available labels (e.g. provider, ISUP grade and Gleason score) in the caption
+        caption = ' | '.join(html.escape(str(v)) for k, v in entry.items()
+                             if k not in ('thumbnail', 'overlay', 'rendered', 'error'))
+        if entry['error']:
+            caption += f'<br><span class="error">Failed: {html.escape(entry["error"])}</span>'
+        figures.append(f'<figure id="{html.escape(entry["image_id"])}">{images}<figcaption>{caption}</figcaption></figure>')
+
+    n_failed = sum(1 for e in entries if e['error'])
+
+    with open(path, 'w') as f:
+        f.write(f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<style>
+body {{ font-family: sans-serif; }}
+figure {{ display: inline-block; margin: 8px; vertical-align: top; }}
+img {{ max-width: 300px; max-height: 300px; margin-right: 4px; }}
+figcaption {{ font-size: small; }}
+.error {{ color: red; }}
+</style>
+</head>
+<body>
+<h1>{html.escape(title)} ({len(figures)} slides, {n_failed} failed)</h1>
+{chr(10).join(figures)}
+</body>
+</html>
+""")
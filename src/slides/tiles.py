@@ -0,0 +1,244 @@
+"""
+Streaming tile batch generator for model training.
+
+Turns a list of image ids and labels into fixed-size batches of tiles per biopsy. Slides are read in a background
+thread pool (openslide releases the GIL while decoding) with a bounded number of batches in flight. Batches are
+written into a small ring of preallocated NumPy buffers that are reused across the whole epoch.
+"""
+import os
+import collections
+import concurrent.futures
+
+import numpy as np
+
+# Value used to fill tiles that fall outside the slide (white background)
+BACKGROUND_VALUE = 255
+
+
+def select_tiles(image, tile_size, n_tiles, out):
+    """Split an image into tiles and copy the tiles containing the most tissue into an output buffer.
+
+    Tissue is assumed to be darker than the white background, so tiles are ranked on the sum of their pixel values.
+
+    Args:
+        image: RGB image as a uint8 array of shape (height, width, 3).
+        tile_size: Size of the square tiles in pixels.
+        n_tiles: Number of tiles to select.
+        out: Sequence of n_tiles arrays of shape (tile_size, tile_size, 3) to write the tiles to.
+
+    Returns:
+        Indices (row-major in the tile grid) of the selected tiles.
+    """
+    height, width = image.shape[:2]
+    rows, cols = -(-height // tile_size), -(-width // tile_size)
+    full_rows, full_cols = height // tile_size, width // tile_size
+    border_h, border_w = height - full_rows * tile_size, width - full_cols * tile_size
+
+    # Tiles with the lowest intensity contain the most tissue
+    scores = np.empty((rows, cols), dtype=np.int64)
+
+    # Splitting the axes of the image gives a strided view, so the full tiles are scored without copying
+    full = image[:full_rows * tile_size, :full_cols * tile_size]
+    scores[:full_rows, :full_cols] = full.reshape(full_rows, tile_size, full_cols, tile_size, 3) \
+        .sum(axis=(1, 3, 4), dtype=np.int64)
+
+    # Partial tiles at the right and bottom border are scored as if padded with background
+    if border_w:
+        right = image[:full_rows * tile_size, full_cols * tile_size:]
+        scores[:full_rows, -1] = right.reshape(full_rows, tile_size, border_w, 3).sum(axis=(1, 2, 3), dtype=np.int64) \
+            + (tile_size - border_w) * tile_size * 3 * BACKGROUND_VALUE
+    if border_h:
+        bottom = image[full_rows * tile_size:, :full_cols * tile_size]
+        scores[-1, :full_cols] = bottom.reshape(border_h, full_cols, tile_size, 3).sum(axis=(0, 2, 3), dtype=np.int64) \
+            + (tile_size - border_h) * tile_size * 3 * BACKGROUND_VALUE
+    if border_h and border_w:
+        corner = image[full_rows * tile_size:, full_cols * tile_size:]
+        scores[-1, -1] = corner.sum(dtype=np.int64) + (tile_size * tile_size - border_h * border_w) * 3 * BACKGROUND_VALUE
+
+    selected = np.argsort(scores.ravel(), kind='stable')[:n_tiles]
+
+    # Only the selected tiles are copied, straight from the image into the output buffer
+    for k in range(n_tiles):
+        if k < len(selected):
+            row, col = divmod(selected[k], cols)
+            tile = image[row * tile_size:(row + 1) * tile_size, col * tile_size:(col + 1) * tile_size]
+            if tile.shape[:2] != (tile_size, tile_size):
+                out[k][...] = BACKGROUND_VALUE
+            out[k][:tile.shape[0], :tile.shape[1]] = tile
+        else:
+            # Small biopsies may not contain enough tiles
+            out[k][...] = BACKGROUND_VALUE
+
+    return selected
+
+
+def read_tiles(slide_path, level, tile_size, n_tiles, out):
+    """Read a single pyramid level of a slide and write its tissue tiles into an output buffer.
+
+    Args:
+        slide_path: Path to the slide.
+        level: Pyramid level to read from.
+        tile_size: Size of the square tiles in pixels.
+        n_tiles: Number of tiles to select.
+        out: Sequence of n_tiles arrays of shape (tile_size, tile_size, 3) to write the tiles to.
+
+    Returns:
+        Indices of the selected tiles.
+    """
+    import openslide
+
+    slide = openslide.OpenSlide(slide_path)
+    try:
+        # Read the full level in one call instead of decoding tile by tile
+        region = slide.read_region((0, 0), level, slide.level_dimensions[level])
+    finally:
+        slide.close()
+
+    # Drop the alpha channel returned by openslide (a view, the only copy is the conversion from PIL)
+    image = np.asarray(region)[:, :, :3]
+
+    return select_tiles(image=image, tile_size=tile_size, n_tiles=n_tiles, out=out)
+
+
+class TileBatchGenerator(object):
+    """Generate batches of tiles for a list of slides.
+
+    Each sample is either a stack of tiles with shape (n_tiles, tile_size, tile_size, 3), or, when concatenate is
+    set, a single square grid of tiles with shape (grid * tile_size, grid * tile_size, 3).
+
+    The yielded arrays are views on reused buffers: they are only valid until the next batch is requested. Copy
+    them if they need to be kept around longer.
+    """
+
+    def __init__(self, image_ids, labels, data_dir, batch_size=16, n_tiles=16, tile_size=128, level=1,
+                 concatenate=False, n_workers=4, prefetch=2, shuffle=True, random_seed=1):
+        """Initialize the generator.
+
+        Args:
+            image_ids: List of image ids to read.
+            labels: Label for each image id (e.g. the ISUP grade).
+            data_dir: Directory containing the <image_id>.tiff slides.
+            batch_size: Number of slides per batch.
+            n_tiles: Number of tiles per slide, must be a square number if concatenate is set.
+            tile_size: Size of the square tiles in pixels.
+            level: Pyramid level to read from.
+            concatenate: Concatenate the tiles of a slide into a single grid image.
+            n_workers: Number of threads reading slides.
+            prefetch: Number of batches to read ahead of the training loop.
+            shuffle: Shuffle the slides at the start of every epoch.
+            random_seed: Random seed for shuffling.
+        """
+        if len(image_ids) != len(labels):
+            raise Exception("The number of image ids and labels should be equal.")
+
+        grid = int(round(np.sqrt(n_tiles)))
+        if concatenate and grid * grid != n_tiles:
+            raise Exception("The number of tiles should be a square number to concatenate them into a grid.")
+
+        if prefetch < 1:
+            raise Exception("At least one batch should be prefetched.")
+
+        self._image_ids = list(image_ids)
+        self._labels = np.asarray(labels)
+        self._data_dir = data_dir
+        self._batch_size = batch_size
+        self._n_tiles = n_tiles
+        self._tile_size = tile_size
+        self._level = level
+        self._concatenate = concatenate
+        self._grid = grid
+        self._n_workers = n_workers
+        self._prefetch = prefetch
+        self._shuffle = shuffle
+        self._random_state = np.random.RandomState(random_seed)
+
+    def __len__(self):
+        """Number of batches per epoch"""
+        return (len(self._image_ids) + self._batch_size - 1) // self._batch_size
+
+    def _allocate_buffer(self):
+        """Allocate an image and label buffer for a single batch, including per-sample tile views."""
+        if self._concatenate:
+            size = self._grid * self._tile_size
+            images = np.empty((self._batch_size, size, size, 3), dtype=np.uint8)
+
+            # View each grid image as (row, col, tile_size, tile_size, 3) so tiles are written in place
+            tile_views = []
+            for sample in images:
+                grid = sample.reshape(self._grid, self._tile_size, self._grid, self._tile_size, 3).swapaxes(1, 2)
+                tile_views.append([grid[k // self._grid, k % self._grid] for k in range(self._n_tiles)])
+        else:
+            images = np.empty((self._batch_size, self._n_tiles, self._tile_size, self._tile_size, 3), dtype=np.uint8)
+            tile_views = [list(sample) for sample in images]
+
+        labels = np.empty((self._batch_size,), dtype=self._labels.dtype)
+
+        return images, labels, tile_views
+
+    def _submit_batch(self, executor, buffer, indices):
+        """Schedule reading of all slides in a batch into a buffer.
+
+        Returns:
+            List of futures, one for each slide.
+        """
+        images, labels, tile_views = buffer
+        labels[:len(indices)] = self._labels[indices]
+
+        return [executor.submit(read_tiles,
+                                slide_path=os.path.join(self._data_dir, f'{self._image_ids[i]}.tiff'),
+                                level=self._level,
+                                tile_size=self._tile_size,
+                                n_tiles=self._n_tiles,
+                                out=tile_views[k])
+                for k, i in enumerate(indices)]
+
+    @staticmethod
+    def _wait_for_batch(futures):
+        """Wait until all slides in a batch are read, cancelling the remaining slides if one of them fails."""
+        try:
+            for future in futures:
+                future.result()
+        except BaseException:
+            # The batch is no longer in flight, so it is not cancelled when the iterator is closed
+            for future in futures:
+                future.cancel()
+            raise
+
+    def __iter__(self):
+        """Iterate over one epoch.
+
+        Yields:
+            Tuple of an image batch and a label batch. The last batch can be smaller than batch_size.
+        """
+        if self._shuffle:
+            order = self._random_state.permutation(len(self._image_ids))
+        else:
+            order = np.arange(len(self._image_ids))
+        batches = [order[i:i + self._batch_size] for i in range(0, len(order), self._batch_size)]
+
+        # One buffer is held by the training loop while the others are being filled
+        free_buffers = [self._allocate_buffer() for _ in range(min(self._prefetch + 1, len(batches)))]
+        in_flight = collections.deque()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._n_workers) as executor:
+            try:
+                for indices in batches:
+                    if not free_buffers:
+                        # Wait for the oldest batch and hand it to the training loop
+                        buffer, futures, n = in_flight.popleft()
+                        self._wait_for_batch(futures)
+                        yield buffer[0][:n], buffer[1][:n]
+                        free_buffers.append(buffer)
+
+                    buffer = free_buffers.pop()
+                    in_flight.append((buffer, self._submit_batch(executor, buffer, indices), len(indices)))
+
+                while in_flight:
+                    buffer, futures, n = in_flight.popleft()
+                    self._wait_for_batch(futures)
+                    yield buffer[0][:n], buffer[1][:n]
+            finally:
+                # Do not start reading slides for batches that will never be consumed
+                for _, futures, _ in in_flight:
+                    for future in futures:
+                        future.cancel()